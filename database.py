@@ -2,54 +2,134 @@
 Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
-Import and use these functions in your API endpoints for database operations.
+Import and await these functions in your async API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+import logging
+import msgspec
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from typing import Union
+from typing import List, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _client = None
 db = None
+cache = None
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    _client = AsyncIOMotorClient(database_url)
     db = _client[database_name]
 
+class BulkInsertError(Exception):
+    """Raised when an unordered insert_many only stored part of the batch"""
+
+    def __init__(self, inserted_ids: List[str], errors: List[dict]):
+        super().__init__(f"{len(errors)} of {len(inserted_ids) + len(errors)} documents failed to insert")
+        self.inserted_ids = inserted_ids
+        self.errors = errors
+
+# Optional Redis read-through cache for list queries
+redis_url = os.getenv("REDIS_URL")
+if redis_url:
+    cache = Redis.from_url(redis_url)
+
+def _version_key(collection_name: str) -> str:
+    return f"list:ver:{collection_name}"
+
+async def cache_version(collection_name: str) -> int:
+    """Current cache generation for a collection; bumped on every write"""
+    return int(await cache.get(_version_key(collection_name)) or 0)
+
+def cache_key(collection_name: str, version: int, filter_dict: dict = None, limit: int = None, sort: list = None) -> str:
+    """Build a stable cache key for a list query on a collection at a given generation"""
+    filter_part = ",".join(f"{k}={v}" for k, v in sorted((filter_dict or {}).items()))
+    sort_part = ",".join(f"{field}{direction:+d}" for field, direction in sort or [])
+    return f"list:{collection_name}:{version}:{filter_part}:{sort_part}:{limit}"
+
+async def invalidate_cache(collection_name: str):
+    """Bump a collection's cache generation; keys from older generations are never read again and expire by TTL"""
+    if cache is None:
+        return
+    try:
+        await cache.incr(_version_key(collection_name))
+    except RedisError:
+        # The write itself succeeded; a stale list is bounded by the cache TTL
+        logger.warning("Failed to invalidate list cache for %s", collection_name, exc_info=True)
+
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
+def _to_dict(data: Union[BaseModel, msgspec.Struct, dict]) -> dict:
+    """Convert a Pydantic model, msgspec Struct or dict into a fresh dict"""
+    if isinstance(data, BaseModel):
+        return data.model_dump()
+    if isinstance(data, msgspec.Struct):
+        return msgspec.to_builtins(data)
+    return data.copy()
+
+async def create_document(collection_name: str, data: Union[BaseModel, msgspec.Struct, dict]):
     """Insert a single document with timestamp"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
-    # Convert Pydantic model to dict if needed
-    if isinstance(data, BaseModel):
-        data_dict = data.model_dump()
-    else:
-        data_dict = data.copy()
+    data_dict = _to_dict(data)
 
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
+    await invalidate_cache(collection_name)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
+async def create_documents(collection_name: str, data: List[Union[BaseModel, msgspec.Struct, dict]]):
+    """Insert many documents with timestamps in a single round trip"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if not data:
+        return []
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for item in data:
+        data_dict = _to_dict(item)
+        data_dict['created_at'] = now
+        data_dict['updated_at'] = now
+        docs.append(data_dict)
+
+    try:
+        result = await db[collection_name].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Unordered inserts keep going past failures, so part of the batch is stored
+        await invalidate_cache(collection_name)
+        write_errors = e.details.get("writeErrors", [])
+        failed = {err["index"] for err in write_errors}
+        # insert_many assigns _id to each doc client-side before sending
+        inserted_ids = [str(doc["_id"]) for i, doc in enumerate(docs) if i not in failed]
+        errors = [{"index": err["index"], "code": err.get("code"), "message": err.get("errmsg")} for err in write_errors]
+        raise BulkInsertError(inserted_ids, errors)
+    await invalidate_cache(collection_name)
+    return [str(_id) for _id in result.inserted_ids]
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, sort: list = None):
     """Get documents from collection"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
+
     cursor = db[collection_name].find(filter_dict or {})
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
-    
-    return list(cursor)
+
+    return await cursor.to_list(length=limit or None)
@@ -0,0 +1,16 @@
+"""
+Gunicorn config for production
+
+Run with: gunicorn main:app
+Each worker is a separate Uvicorn event loop, so CPU-bound validation and
+JSON encoding scale across cores instead of sharing one GIL.
+"""
+
+import os
+
+# Respect container CPU limits (affinity) rather than the host core count
+_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", _cpus * 2 + 1))
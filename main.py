@@ -1,35 +1,149 @@
+import asyncio
+import logging
 import os
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+import time
+from typing import List, Literal, Optional
+import msgspec
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from database import db, create_document, get_documents
-from schemas import ALL_MODELS, MediaItem, Message, Conversation, Bot
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field
+from pymongo.errors import PyMongoError
+from redis.exceptions import RedisError
+from database import db, cache, cache_key, cache_version, create_document, create_documents, get_documents, BulkInsertError
+from schemas import ALL_MODELS, MediaItem, MessageFast, Conversation, Bot
+
+logger = logging.getLogger(__name__)
+
+
+def _bson_default(obj):
+    # orjson handles datetimes natively; only BSON ObjectIds need help
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError
+
+
+class MongoJSONResponse(ORJSONResponse):
+    """ORJSONResponse that encodes raw Mongo documents (ObjectId -> str)"""
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, default=_bson_default)
+
+
+LIST_CACHE_TTL = int(os.getenv("LIST_CACHE_TTL", 30))
+
+
+async def _list_documents(collection_name: str, filter_q: dict, limit: int, sort: list = None):
+    # Read-through cache of the encoded response body, keyed by query
+    # Redis is optional: any cache failure falls back to reading from Mongo
+    key = version = None
+    if cache is not None:
+        try:
+            version = await cache_version(collection_name)
+            key = cache_key(collection_name, version, filter_q, limit, sort)
+            body = await cache.get(key)
+        except RedisError:
+            logger.warning("List cache unavailable, reading from Mongo", exc_info=True)
+            key = body = None
+        if body is not None:
+            return MongoJSONResponse(body)
+    # limit is capped, so fetch the whole page before responding and encode it in one
+    # pass; Mongo errors surface as an error status rather than a truncated 200
+    items = await get_documents(collection_name, filter_q, limit, sort=sort)
+    body = orjson.dumps(items, default=_bson_default)
+    if key is not None:
+        try:
+            # A write since the version was read bumps the generation; don't cache a body it may have missed
+            if await cache_version(collection_name) == version:
+                await cache.setex(key, LIST_CACHE_TTL, body)
+        except RedisError:
+            logger.warning("Failed to populate list cache key %s", key, exc_info=True)
+    return MongoJSONResponse(body)
+
+
+app = FastAPI(title="TeleBuddy API", default_response_class=ORJSONResponse)
+
+# Schemas are immutable for the process lifetime, so build and encode them once
+_SCHEMA_JSON = orjson.dumps({name: model.model_json_schema() for name, model in ALL_MODELS.items()})
+
+# Upper bound on items per bulk create request, matching the list limit cap
+BULK_MAX_ITEMS = 500
+
+
+@app.exception_handler(BulkInsertError)
+async def bulk_insert_error_handler(request: Request, exc: BulkInsertError):
+    # Partial success: report which entries were stored and which failed
+    return ORJSONResponse(
+        status_code=207,
+        content={"ids": exc.inserted_ids, "errors": exc.errors},
+    )
 
-app = FastAPI(title="TeleBuddy API")
+# Explicit origins (comma-separated CORS_ORIGINS) are matched with a set lookup
+# and, unlike "*", are compatible with allow_credentials
+CORS_ORIGINS = frozenset(
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "https://app.telebuddy.com,http://localhost:3000").split(",")
+    if origin.strip()
+)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 
+@app.on_event("startup")
+async def ensure_indexes():
+    # Back the filtered list endpoints (media/conversations by bot, messages by conversation)
+    if db is None:
+        return
+    try:
+        await db.mediaitem.create_index("bot_id")
+        await db.conversation.create_index("bot_id")
+        await db.message.create_index([("conversation_id", 1), ("_id", -1)])
+    except PyMongoError:
+        # Don't block startup on an unreachable database; /test reports the connection state
+        logger.exception("Failed to create MongoDB indexes")
+
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "TeleBuddy backend running"}
 
 
 @app.get("/schema")
-def get_schema():
+async def get_schema():
     # Return available Pydantic schemas for the DB viewer tools
-    return {name: model.model_json_schema() for name, model in ALL_MODELS.items()}
+    return Response(content=_SCHEMA_JSON, media_type="application/json")
+
+
+# Env is fixed for the process lifetime and collection names rarely change,
+# so the health check avoids re-reading env and hitting Mongo on every poll
+_DB_URL_SET = bool(os.getenv("DATABASE_URL"))
+_DB_NAME_SET = bool(os.getenv("DATABASE_NAME"))
+COLLECTIONS_CACHE_TTL = 30
+_collections_cache = (0.0, None)
+
+
+async def _cached_collections():
+    global _collections_cache
+    fetched_at, collections = _collections_cache
+    if collections is None or time.monotonic() - fetched_at > COLLECTIONS_CACHE_TTL:
+        collections = await db.list_collection_names()
+        _collections_cache = (time.monotonic(), collections)
+    return collections
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -41,10 +155,10 @@ def test_database():
     try:
         if db is not None:
             response["database"] = "✅ Available"
-            response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
+            response["database_url"] = "✅ Set" if _DB_URL_SET else "❌ Not Set"
+            response["database_name"] = "✅ Set" if _DB_NAME_SET else "❌ Not Set"
             try:
-                collections = db.list_collection_names()
+                collections = await _cached_collections()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
                 response["connection_status"] = "Connected"
@@ -58,52 +172,86 @@ def test_database():
 
 
 # Simple seed endpoints for demo: list/create media items and conversations
+# Request models carry the same constraints as the stored schemas, so handlers
+# can build documents with model_construct() instead of validating twice.
 class CreateMediaRequest(BaseModel):
     bot_id: str
-    type: str
+    type: Literal["photo", "video", "document"]
     caption: Optional[str] = None
-    price: Optional[float] = None
+    price: Optional[float] = Field(None, ge=0)
     external_url: Optional[str] = None
 
 
-@app.get("/api/media", response_model=List[dict])
-def list_media(bot_id: Optional[str] = None, limit: int = 50):
+@app.get("/api/media", response_model=None)
+async def list_media(bot_id: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
     filter_q = {"bot_id": bot_id} if bot_id else {}
-    items = get_documents("mediaitem", filter_q, limit)
-    # Convert ObjectId to str
-    for it in items:
-        it["_id"] = str(it["_id"])
-    return items
+    return await _list_documents("mediaitem", filter_q, limit)
 
 
 @app.post("/api/media")
-def create_media(payload: CreateMediaRequest):
-    doc = MediaItem(**payload.model_dump())
-    inserted_id = create_document("mediaitem", doc)
+async def create_media(payload: CreateMediaRequest):
+    doc = MediaItem.model_construct(**payload.model_dump())
+    inserted_id = await create_document("mediaitem", doc)
     return {"id": inserted_id}
 
 
+@app.post("/api/media/bulk")
+async def create_media_bulk(payload: List[CreateMediaRequest] = Body(..., max_length=BULK_MAX_ITEMS)):
+    docs = [MediaItem.model_construct(**p.model_dump()) for p in payload]
+    inserted_ids = await create_documents("mediaitem", docs)
+    return {"ids": inserted_ids}
+
+
 class CreateConversationRequest(BaseModel):
     bot_id: str
     fan_id: str
     last_message_preview: Optional[str] = None
 
 
-@app.get("/api/conversations", response_model=List[dict])
-def list_conversations(bot_id: str, limit: int = 50):
-    items = get_documents("conversation", {"bot_id": bot_id}, limit)
-    for it in items:
-        it["_id"] = str(it["_id"])
-    return items
+@app.get("/api/conversations", response_model=None)
+async def list_conversations(bot_id: str, limit: int = Query(50, ge=1, le=500)):
+    return await _list_documents("conversation", {"bot_id": bot_id}, limit)
 
 
 @app.post("/api/conversations")
-def create_conversation(payload: CreateConversationRequest):
-    doc = Conversation(**payload.model_dump())
-    inserted_id = create_document("conversation", doc)
+async def create_conversation(payload: CreateConversationRequest):
+    doc = Conversation.model_construct(**payload.model_dump())
+    inserted_id = await create_document("conversation", doc)
     return {"id": inserted_id}
 
 
+@app.post("/api/conversations/bulk")
+async def create_conversations_bulk(payload: List[CreateConversationRequest] = Body(..., max_length=BULK_MAX_ITEMS)):
+    docs = [Conversation.model_construct(**p.model_dump()) for p in payload]
+    inserted_ids = await create_documents("conversation", docs)
+    return {"ids": inserted_ids}
+
+
+# Strong references to in-flight fire-and-forget writes so they are not GC'd mid-run
+_background_tasks = set()
+# Beyond this many in-flight writes, send_message awaits its insert inline (backpressure)
+MAX_BACKGROUND_WRITES = int(os.getenv("MAX_BACKGROUND_WRITES", 100))
+
+
+def _track_background_write(task: asyncio.Task, _id: ObjectId):
+    def _done(task: asyncio.Task):
+        _background_tasks.discard(task)
+        if task.cancelled():
+            logger.error("Background insert of message %s was cancelled", _id)
+        elif task.exception() is not None:
+            logger.error("Background insert of message %s failed", _id, exc_info=task.exception())
+
+    _background_tasks.add(task)
+    task.add_done_callback(_done)
+
+
+@app.on_event("shutdown")
+async def drain_background_writes():
+    # Let in-flight writes finish on graceful worker restarts instead of dropping them
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+
 class SendMessageRequest(BaseModel):
     conversation_id: str
     text: Optional[str] = None
@@ -112,19 +260,31 @@ class SendMessageRequest(BaseModel):
     price: Optional[float] = None
 
 
-@app.get("/api/messages", response_model=List[dict])
-def list_messages(conversation_id: str, limit: int = 100):
-    items = get_documents("message", {"conversation_id": conversation_id}, limit)
-    for it in items:
-        it["_id"] = str(it["_id"])
-    return items
+@app.get("/api/messages", response_model=None)
+async def list_messages(
+    conversation_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    after_id: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+):
+    # Oldest first by default; order=desc returns newest first. Pass the last _id of
+    # a page as after_id to fetch the next one in the same direction.
+    # Walks the (conversation_id, _id) index instead of skipping over it.
+    filter_q = {"conversation_id": conversation_id}
+    if after_id:
+        try:
+            filter_q["_id"] = {"$gt" if order == "asc" else "$lt": ObjectId(after_id)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid after_id")
+    sort = [("_id", 1 if order == "asc" else -1)]
+    return await _list_documents("message", filter_q, limit, sort=sort)
 
 
 @app.post("/api/messages")
-def send_message(payload: SendMessageRequest):
+async def send_message(payload: SendMessageRequest):
     # In a real integration, we would call Telegram here.
     # For this demo, we store the message and mimic an instant telegram_message_id.
-    msg = Message(
+    msg = MessageFast(
         conversation_id=payload.conversation_id,
         direction="outbound",
         text=payload.text,
@@ -133,8 +293,30 @@ def send_message(payload: SendMessageRequest):
         price=payload.price,
         telegram_message_id=123456  # demo placeholder
     )
-    inserted_id = create_document("message", msg)
-    return {"id": inserted_id, "telegram_message_id": msg.telegram_message_id}
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    # The _id is generated client-side, so respond without waiting for the insert ack.
+    # Demo trade-off: a failed background write is not reported to the caller.
+    # Bounded by MAX_BACKGROUND_WRITES: once that many are pending (e.g. Mongo is slow),
+    # the insert is awaited inline so requests slow down instead of queueing unbounded tasks.
+    _id = ObjectId()
+    doc = {"_id": _id, **msgspec.to_builtins(msg)}
+    if len(_background_tasks) >= MAX_BACKGROUND_WRITES:
+        await create_document("message", doc)
+    else:
+        _track_background_write(asyncio.create_task(create_document("message", doc)), _id)
+    return {"id": str(_id), "telegram_message_id": msg.telegram_message_id}
+
+
+@app.post("/api/messages/bulk")
+async def send_messages_bulk(payload: List[SendMessageRequest] = Body(..., max_length=BULK_MAX_ITEMS)):
+    # Bulk import/seed path: store outbound messages without a Telegram delivery id
+    msgs = [
+        MessageFast(**p.model_dump(), direction="outbound")
+        for p in payload
+    ]
+    inserted_ids = await create_documents("message", msgs)
+    return {"ids": inserted_ids}
 
 
 # Minimal bot management for multi-bot tab bar
@@ -143,22 +325,27 @@ class CreateBotRequest(BaseModel):
     username: Optional[str] = None
 
 
-@app.get("/api/bots", response_model=List[dict])
-def list_bots(limit: int = 20):
-    items = get_documents("bot", {}, limit)
-    for it in items:
-        it["_id"] = str(it["_id"])
-    return items
+@app.get("/api/bots", response_model=None)
+async def list_bots(limit: int = Query(20, ge=1, le=500)):
+    return await _list_documents("bot", {}, limit)
 
 
 @app.post("/api/bots")
-def create_bot(payload: CreateBotRequest):
-    bot = Bot(name=payload.name, username=payload.username)
-    inserted_id = create_document("bot", bot)
+async def create_bot(payload: CreateBotRequest):
+    bot = Bot.model_construct(name=payload.name, username=payload.username)
+    inserted_id = await create_document("bot", bot)
     return {"id": inserted_id}
 
 
+@app.post("/api/bots/bulk")
+async def create_bots_bulk(payload: List[CreateBotRequest] = Body(..., max_length=BULK_MAX_ITEMS)):
+    bots = [Bot.model_construct(name=p.name, username=p.username) for p in payload]
+    inserted_ids = await create_documents("bot", bots)
+    return {"ids": inserted_ids}
+
+
+# Single-process dev server; production runs multiple workers via gunicorn.conf.py
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port, loop="uvloop", http="httptools")
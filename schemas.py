@@ -7,8 +7,10 @@ Example: class Bot -> collection "bot"
 These schemas are returned via GET /schema for the built-in DB viewer.
 """
 from __future__ import annotations
+from types import MappingProxyType
+import msgspec
 from pydantic import BaseModel, Field, HttpUrl
-from typing import List, Optional, Literal, Dict, Any
+from typing import List, Optional, Literal, Mapping, Any
 
 
 class Bot(BaseModel):
@@ -73,6 +75,22 @@ class Message(BaseModel):
     telegram_file_id: Optional[str] = Field(None, description="file_id used for instant delivery if any")
 
 
+class MessageFast(msgspec.Struct, kw_only=True, gc=False):
+    """Internal mirror of Message for the send path; not exposed via /schema
+
+    Structs are slotted, and gc=False keeps these scalar-only instances out of
+    the cyclic garbage collector.
+    """
+    conversation_id: str
+    direction: Literal["inbound", "outbound"]
+    text: Optional[str] = None
+    media_item_id: Optional[str] = None
+    price: Optional[float] = None
+    paid: bool = False
+    telegram_message_id: Optional[int] = None
+    telegram_file_id: Optional[str] = None
+
+
 class Team(BaseModel):
     name: str = Field(..., description="Team name")
 
@@ -91,8 +109,8 @@ class AnalyticsDaily(BaseModel):
     unique_fans: int = 0
 
 
-# Export model list for /schema endpoint convenience
-ALL_MODELS: Dict[str, Any] = {
+# Export model list for /schema endpoint convenience (read-only)
+ALL_MODELS: Mapping[str, Any] = MappingProxyType({
     "Bot": Bot,
     "Fan": Fan,
     "MediaItem": MediaItem,
@@ -103,4 +121,4 @@ ALL_MODELS: Dict[str, Any] = {
     "Team": Team,
     "TeamMember": TeamMember,
     "AnalyticsDaily": AnalyticsDaily,
-}
+})